@@ -0,0 +1,76 @@
+"""
+Response cache for agent runs.
+
+Identical prompts sent to the same agent return the earlier result instead of making
+another round-trip to the model. Only use this for stateless lookups (like flight
+searches); runs with side effects or message history should call the agent directly.
+
+Two things to be aware of:
+- Concurrent misses for the same prompt aren't coalesced: each one calls the model.
+- A cache hit adds nothing to the caller's `usage`, since no request was made.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple, TypeVar
+
+from pydantic_ai import Agent
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.models import Model
+from pydantic_ai.usage import Usage, UsageLimits
+
+from config import AGENT_SEMAPHORE
+
+ResultT = TypeVar("ResultT")
+
+# Maximum number of cached responses before the least recently used are evicted
+CACHE_SIZE = 256
+
+# (agent id, model name, prompt digest) -> (expiry time, agent, run result). The entry keeps
+# the agent alive, so its id can't be reused by another agent while the entry exists.
+_cache: OrderedDict[Tuple[int, str, str], Tuple[float, Agent[None, Any], AgentRunResult[Any]]] = OrderedDict()
+
+
+def _cache_key(agent: Agent[None, Any], prompt: str) -> Tuple[int, str, str]:
+    model_name = agent.model.model_name if isinstance(agent.model, Model) else str(agent.model)
+    return id(agent), model_name, hashlib.blake2b(prompt.encode()).hexdigest()
+
+
+async def cached_run(
+    agent: Agent[None, ResultT],
+    prompt: str,
+    *,
+    usage: Optional[Usage] = None,
+    usage_limits: Optional[UsageLimits] = None,
+    ttl: float = 3600,
+    timeout: Optional[float] = None,
+) -> AgentRunResult[ResultT]:
+    """Run an agent, reusing a cached result for the same prompt if one is less than `ttl` seconds old.
+
+    `timeout` limits the model run itself; time spent waiting for a free agent slot doesn't count.
+    """
+    key = _cache_key(agent, prompt)
+    now = time.monotonic()
+
+    cached = _cache.get(key)
+    if cached is not None and cached[0] > now:
+        _cache.move_to_end(key)
+        return cached[2]
+
+    async with AGENT_SEMAPHORE:
+        async with asyncio.timeout(timeout):
+            result = await agent.run(prompt, usage=usage, usage_limits=usage_limits)
+
+    _cache[key] = (now + ttl, agent, result)
+    _cache.move_to_end(key)
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+    return result
+
+
+def clear_cache() -> None:
+    """Drop all cached agent results."""
+    _cache.clear()
@@ -8,19 +8,23 @@ delegates specific tasks to specialized agents:
 """
 
 import asyncio
+from collections import defaultdict
 from datetime import date
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
-import dotenv
-import logfire
 from pydantic_ai import Agent, RunContext
+from pydantic_ai.agent import AgentRunResult
 from pydantic_ai.usage import UsageLimits
 
+from agent_cache import cached_run
+from bootstrap import init, run
 from config import ACTIVE_MODEL
 from models import FlightDetails, TravelPlan
 
-dotenv.load_dotenv()
-logfire.configure(send_to_logfire="if-token-present")
+init()
+
+# Wall-clock limit for a single search, so one slow run can't hold up the whole batch
+SEARCH_TIMEOUT_SECONDS = 15.0
 
 # Flight search agent (delegate)
 flight_search_agent: Agent[None, List[FlightDetails]] = Agent(
@@ -42,7 +46,7 @@ travel_planner_agent: Agent[None, TravelPlan] = Agent(
 
 # Mock flight database
 MOCK_FLIGHTS = [
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="AA123",
         price=299.99,
         origin="SFO",
@@ -51,7 +55,7 @@ MOCK_FLIGHTS = [
         arrival_date=date(2024, 5, 1),
         duration_hours=5.5,
     ),
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="UA456",
         price=349.99,
         origin="SFO",
@@ -61,7 +65,7 @@ MOCK_FLIGHTS = [
         duration_hours=5.0,
     ),
     # Return flights
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="AA124",
         price=289.99,
         origin="JFK",
@@ -73,10 +77,22 @@ MOCK_FLIGHTS = [
 ]
 
 
+def _build_index(flights: List[FlightDetails]) -> Dict[Tuple[str, str, date], List[FlightDetails]]:
+    index: Dict[Tuple[str, str, date], List[FlightDetails]] = defaultdict(list)
+    for flight in flights:
+        index[(flight.origin, flight.destination, flight.departure_date)].append(flight)
+    return index
+
+
+# Flights indexed by route and departure date, so lookups don't scan the whole database
+FLIGHT_INDEX = _build_index(MOCK_FLIGHTS)
+
+
 @flight_search_agent.tool
 async def search_flights(ctx: RunContext[None], origin: str, destination: str, date: date) -> List[FlightDetails]:
     """Search for available flights."""
-    return [f for f in MOCK_FLIGHTS if f.origin == origin and f.destination == destination and f.departure_date == date]
+    # Normalize the codes so "sfo" and " SFO" find the same flights
+    return list(FLIGHT_INDEX.get((origin.strip().upper(), destination.strip().upper(), date), []))
 
 
 @travel_planner_agent.tool
@@ -84,21 +100,33 @@ async def find_flights(
     ctx: RunContext[None], origin: str, destination: str, departure_date: date, return_date: Optional[date] = None
 ) -> List[FlightDetails]:
     """Find flights using the specialized flight search agent."""
-    # Delegate flight search to the specialized agent
-    outbound_result = await flight_search_agent.run(
-        f"Find flights from {origin} to {destination} on {departure_date}",
-        usage=ctx.usage,  # Pass usage context to track total usage
-    )
+    # Delegate flight search to the specialized agent. Both legs go in a single request, so the
+    # delegate can search them from one turn instead of needing a separate run per leg.
+    prompt = f"Find flights from {origin} to {destination} on {departure_date}"
+    if return_date:
+        prompt += f", and return flights from {destination} to {origin} on {return_date}"
 
-    flights = outbound_result.data
+    result = await cached_run(flight_search_agent, prompt, usage=ctx.usage)  # Pass usage context to track total usage
+
+    # Copy the list so callers can't change the cached result
+    return list(result.data)
 
-    if return_date:
-        return_result = await flight_search_agent.run(
-            f"Find flights from {destination} to {origin} on {return_date}", usage=ctx.usage
-        )
-        flights.extend(return_result.data)
 
-    return flights
+async def run_batch_async(
+    prompts: Sequence[str],
+    usage_limits: Optional[UsageLimits] = None,
+    timeout: float = SEARCH_TIMEOUT_SECONDS,
+) -> List[Union[AgentRunResult[List[FlightDetails]], BaseException]]:
+    """Run the flight search agent over many prompts concurrently.
+
+    At most MAX_AGENT_CONCURRENCY searches talk to the model at once, and each gets `timeout`
+    seconds once it starts. Results are returned in the same order as `prompts`; a failed or
+    timed out search returns its exception.
+    """
+    return await asyncio.gather(
+        *(cached_run(flight_search_agent, prompt, usage_limits=usage_limits, timeout=timeout) for prompt in prompts),
+        return_exceptions=True,
+    )
 
 
 async def main() -> None:
@@ -135,4 +163,4 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
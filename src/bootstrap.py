@@ -0,0 +1,49 @@
+"""
+Process setup shared by the examples: environment variables, logging and the event loop.
+"""
+
+import asyncio
+import os
+from typing import Any, Coroutine
+
+import dotenv
+import logfire
+from pydantic_ai.models import cached_async_http_client
+
+_initialized = False
+
+
+def init() -> None:
+    """Load environment variables and configure logfire. Safe to call more than once."""
+    global _initialized
+    if _initialized:
+        return
+
+    dotenv.load_dotenv()
+    if os.getenv("LOGFIRE_TOKEN"):
+        logfire.configure(send_to_logfire=True)
+    else:
+        # Nothing is exported without a token, so don't pay for console output or scrubbing either
+        logfire.configure(send_to_logfire=False, console=False, scrubbing=False)
+    _initialized = True
+
+
+async def _run_and_close(main: Coroutine[Any, Any, None]) -> None:
+    try:
+        await main
+    finally:
+        # Every model uses pydantic-ai's shared client unless it's given its own
+        await cached_async_http_client().aclose()
+
+
+def run(main: Coroutine[Any, Any, None]) -> None:
+    """Run an example's main() coroutine, then close pydantic-ai's shared HTTP client.
+
+    Uses uvloop if it's installed (uvloop isn't available on Windows).
+    """
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(_run_and_close(main))
+    else:
+        asyncio.run(_run_and_close(main), loop_factory=uvloop.new_event_loop)
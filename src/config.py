@@ -2,15 +2,17 @@
 Configuration for LLM models and other settings.
 """
 
+import asyncio
 import os
-from typing import Literal, Union
+from typing import Callable, Dict, Literal, Union
 
-import dotenv
 from pydantic_ai.models import Model
 from pydantic_ai.models.openai import OpenAIModel
 
-# Load environment variables
-dotenv.load_dotenv()
+from bootstrap import init
+
+# Load environment variables and configure logging
+init()
 
 # Model type for type checking
 ModelType = Literal["groq:llama-3.3-70b-versatile"]
@@ -18,18 +20,45 @@ ModelType = Literal["groq:llama-3.3-70b-versatile"]
 # Default model configuration
 DEFAULT_MODEL: ModelType = "groq:llama-3.3-70b-versatile"
 
-# Alternative model configurations
-TOGETHER_MODEL: Model = OpenAIModel(
-    model_name=os.getenv("LLM_MODEL", "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"),
-    base_url="https://api.together.xyz/v1",
-    api_key=os.getenv("TOGETHER_API_KEY"),
-)
 
-OPENROUTER_MODEL: Model = OpenAIModel(
-    model_name="microsoft/phi-3-medium-128k-instruct:free",
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPEN_ROUTER_KEY"),
-)
+def _together_model() -> Model:
+    return OpenAIModel(
+        model_name=os.getenv("LLM_MODEL", "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"),
+        base_url="https://api.together.xyz/v1",
+        api_key=os.getenv("TOGETHER_API_KEY"),
+    )
+
+
+def _openrouter_model() -> Model:
+    return OpenAIModel(
+        model_name="microsoft/phi-3-medium-128k-instruct:free",
+        base_url="https://openrouter.ai/api/v1",
+        api_key=os.getenv("OPEN_ROUTER_KEY"),
+    )
+
+
+# Alternative model configurations (TOGETHER_MODEL, OPENROUTER_MODEL). These are only
+# built the first time they're accessed, since constructing a model sets up an API client.
+_LAZY_MODELS: Dict[str, Callable[[], Model]] = {
+    "TOGETHER_MODEL": _together_model,
+    "OPENROUTER_MODEL": _openrouter_model,
+}
+
+
+def __getattr__(name: str) -> Model:
+    if name not in _LAZY_MODELS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    model = _LAZY_MODELS[name]()
+    globals()[name] = model
+    return model
+
 
 # Model to use across the application
 ACTIVE_MODEL: ModelType = DEFAULT_MODEL
+
+# Maximum number of agent runs in flight at once, to stay under provider rate limits
+MAX_AGENT_CONCURRENCY = int(os.getenv("MAX_AGENT_CONCURRENCY", "4"))
+
+# Shared by every leaf agent run (those that don't call other agents, so holding a slot can't deadlock)
+AGENT_SEMAPHORE = asyncio.Semaphore(MAX_AGENT_CONCURRENCY)
@@ -0,0 +1,4 @@
+import os
+
+# config builds the Groq client at import time, which needs a key even though tests never call it
+os.environ.setdefault("GROQ_API_KEY", "test")
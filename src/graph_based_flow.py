@@ -11,22 +11,22 @@ This example demonstrates the Graph-Based Flow Pattern for a flight booking syst
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass, field
+import copy
+from dataclasses import dataclass, field, replace
 from datetime import date
-from typing import Dict, List, Optional, Union, cast
+from typing import Dict, List, Optional, Union
 
-import dotenv
-import logfire
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pydantic_ai import Agent
-from pydantic_ai.messages import ModelMessage
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.messages import ModelMessage, ModelRequest, UserPromptPart
 from pydantic_graph import BaseNode, End, Graph, GraphRunContext
 
-from config import ACTIVE_MODEL
+from bootstrap import init, run
+from config import ACTIVE_MODEL, AGENT_SEMAPHORE
 from models import BookingFailed, FlightDetails, PaymentDetails, SeatPreference
 
-dotenv.load_dotenv()
-logfire.configure(send_to_logfire="if-token-present")
+init()
 
 # Create agents with proper model name
 flight_search_agent: Agent[None, List[FlightDetails]] = Agent(
@@ -38,6 +38,7 @@ flight_search_agent: Agent[None, List[FlightDetails]] = Agent(
 seat_selection_agent: Agent[None, SeatPreference] = Agent(
     ACTIVE_MODEL,
     result_type=SeatPreference,
+    retries=3,
     system_prompt="""Help users select their seat based on their preferences.
     - Rows 1, 14, and 20 have extra legroom
     - Seats A and F are window seats
@@ -49,8 +50,12 @@ seat_selection_agent: Agent[None, SeatPreference] = Agent(
 class PaymentResult(BaseModel):
     """Combined payment result type."""
 
-    success: bool
-    data: Union[PaymentDetails, BookingFailed]
+    data: Union[PaymentDetails, BookingFailed] = Field(discriminator="status")
+
+    @property
+    def success(self) -> bool:
+        # Derived from the status tag, so the model can't return a contradicting flag
+        return self.data.status == "success"
 
 
 payment_agent: Agent[None, PaymentResult] = Agent(
@@ -61,7 +66,7 @@ payment_agent: Agent[None, PaymentResult] = Agent(
 
 # Mock flight database
 MOCK_FLIGHTS = [
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="AA123",
         price=299.99,
         origin="SFO",
@@ -73,7 +78,7 @@ MOCK_FLIGHTS = [
 ]
 
 
-@dataclass
+@dataclass(slots=True)
 class BookingState:
     """State maintained throughout the booking process."""
 
@@ -85,6 +90,72 @@ class BookingState:
     payment_info: Optional[str] = None
     booking_confirmed: bool = False
     agent_messages: Dict[str, List[ModelMessage]] = field(default_factory=dict)
+    # Seat selection started speculatively by SearchFlights, awaited by SelectSeat
+    pending_seat_task: Optional[asyncio.Task[AgentRunResult[SeatPreference]]] = None
+
+
+SEAT_PREFERENCES = "I'd like a window seat with extra legroom if possible"
+
+# Most recent messages kept in each agent's history when the graph loops back to a node
+MAX_HISTORY_MESSAGES = 20
+
+
+def starts_run(message: ModelMessage) -> bool:
+    """Whether a message is the user prompt that starts an agent run."""
+    return isinstance(message, ModelRequest) and any(isinstance(part, UserPromptPart) for part in message.parts)
+
+
+def trim_history(messages: List[ModelMessage], keep: int = MAX_HISTORY_MESSAGES) -> List[ModelMessage]:
+    """Keep the first message (it carries the system prompt) and a window of the most recent ones.
+
+    The window only starts on a user prompt, so tool returns are never cut off from their tool calls.
+    If the latest run alone is longer than `keep`, the whole of that run is kept.
+    """
+    if len(messages) <= keep + 1:
+        return messages
+
+    window_start = len(messages) - keep
+    run_starts = [index for index in range(1, len(messages)) if starts_run(messages[index])]
+    in_window = [index for index in run_starts if index >= window_start]
+    if in_window:
+        start = in_window[0]
+    elif run_starts:
+        start = run_starts[-1]
+    else:
+        # A single run, started by the first message
+        return messages
+
+    return [messages[0], *messages[start:]]
+
+
+def snapshot_booking_state(state: BookingState) -> BookingState:
+    """Copy the state for the graph history, leaving out the in-flight seat task (tasks can't be deep-copied)."""
+    return copy.deepcopy(replace(state, pending_seat_task=None))
+
+
+def start_seat_selection(state: BookingState) -> asyncio.Task[AgentRunResult[SeatPreference]]:
+    """Start the seat selection agent in the background."""
+    if "seat_selection" not in state.agent_messages:
+        state.agent_messages["seat_selection"] = []
+
+    async def select_seat(message_history: List[ModelMessage]) -> AgentRunResult[SeatPreference]:
+        async with AGENT_SEMAPHORE:
+            return await seat_selection_agent.run(SEAT_PREFERENCES, message_history=message_history)
+
+    return asyncio.create_task(select_seat(state.agent_messages["seat_selection"]))
+
+
+def discard_seat_selection(state: BookingState) -> None:
+    """Cancel the pending seat selection, if any, and drop it from the state."""
+    task = state.pending_seat_task
+    state.pending_seat_task = None
+    if task is None:
+        return
+
+    task.cancel()
+    # cancel() does nothing if the task already finished; retrieve any error so asyncio doesn't log it as unhandled
+    if task.done() and not task.cancelled():
+        task.exception()
 
 
 @dataclass
@@ -97,15 +168,27 @@ class SearchFlights(BaseNode[BookingState]):
         if "flight_search" not in ctx.state.agent_messages:
             ctx.state.agent_messages["flight_search"] = []
 
-        result = await flight_search_agent.run(
-            f"Find flights from {ctx.state.origin} to {ctx.state.destination} on {ctx.state.travel_date}",
-            message_history=ctx.state.agent_messages["flight_search"],
-        )
+        # Seat preferences don't depend on which flight gets picked, so run the seat
+        # selection agent alongside the flight search instead of after it
+        if ctx.state.pending_seat_task is None:
+            ctx.state.pending_seat_task = start_seat_selection(ctx.state)
+
+        try:
+            async with AGENT_SEMAPHORE:
+                result = await flight_search_agent.run(
+                    f"Find flights from {ctx.state.origin} to {ctx.state.destination} on {ctx.state.travel_date}",
+                    message_history=ctx.state.agent_messages["flight_search"],
+                )
+        except BaseException:
+            # Don't leave the seat selection running (and holding a slot) if the search fails
+            discard_seat_selection(ctx.state)
+            raise
 
-        ctx.state.agent_messages["flight_search"].extend(result.all_messages())
+        ctx.state.agent_messages["flight_search"] = trim_history(result.all_messages())
 
         if not result.data:
             print("No flights found")
+            discard_seat_selection(ctx.state)
             return End(data=None)
 
         ctx.state.selected_flight = result.data[0]
@@ -119,19 +202,34 @@ class SelectSeat(BaseNode[BookingState]):
     docstring_notes = True
 
     async def run(self, ctx: GraphRunContext[BookingState]) -> BaseNode[BookingState]:
-        if "seat_selection" not in ctx.state.agent_messages:
-            ctx.state.agent_messages["seat_selection"] = []
+        seat_task = ctx.state.pending_seat_task or start_seat_selection(ctx.state)
+        ctx.state.pending_seat_task = None
 
-        result = await seat_selection_agent.run(
-            "I'd like a window seat with extra legroom if possible",
-            message_history=ctx.state.agent_messages["seat_selection"],
-        )
+        # If this node is cancelled while waiting, asyncio cancels the awaited seat task too
+        result = await seat_task
 
-        ctx.state.agent_messages["seat_selection"].extend(result.all_messages())
+        ctx.state.agent_messages["seat_selection"] = trim_history(result.all_messages())
         ctx.state.selected_seat = result.data
         return ProcessPayment()
 
 
+def payment_succeeded(ctx: GraphRunContext[BookingState], payment: PaymentDetails) -> End[None]:
+    """Confirm the booking and finish the graph."""
+    print("\nBooking confirmed!")
+    print(f"Confirmation number: {payment.confirmation_number}")
+    print(f"Total amount paid: ${payment.total_amount}")
+    print(f"Payment method: {payment.payment_method}")
+
+    ctx.state.booking_confirmed = True
+    return End(data=None)
+
+
+def payment_failed(ctx: GraphRunContext[BookingState], failure: BookingFailed) -> SearchFlights:
+    """Report the failure and go back to searching for flights."""
+    print(f"Booking failed: {failure.reason}")
+    return SearchFlights()
+
+
 @dataclass
 class ProcessPayment(BaseNode[BookingState]):
     """Process payment for the flight booking."""
@@ -145,39 +243,33 @@ class ProcessPayment(BaseNode[BookingState]):
         assert ctx.state.selected_flight is not None
         assert ctx.state.selected_seat is not None
 
-        result = await payment_agent.run(
-            f"""Process payment for:
+        async with AGENT_SEMAPHORE:
+            result = await payment_agent.run(
+                f"""Process payment for:
             Flight: {ctx.state.selected_flight.flight_number}
             Price: ${ctx.state.selected_flight.price}
             Seat: {ctx.state.selected_seat.row}{ctx.state.selected_seat.seat}
 
             Payment info: Credit card ending in 1234
             """,
-            message_history=ctx.state.agent_messages["payment"],
-        )
+                message_history=ctx.state.agent_messages["payment"],
+            )
 
-        ctx.state.agent_messages["payment"].extend(result.all_messages())
+        ctx.state.agent_messages["payment"] = trim_history(result.all_messages())
         payment_result = result.data
 
-        if not payment_result.success:
-            failed_payment = cast(BookingFailed, payment_result.data)
-            print(f"Booking failed: {failed_payment.reason}")
-            return SearchFlights()
-
-        successful_payment = cast(PaymentDetails, payment_result.data)
-        print("\nBooking confirmed!")
-        print(f"Confirmation number: {successful_payment.confirmation_number}")
-        print(f"Total amount paid: ${successful_payment.total_amount}")
-        print(f"Payment method: {successful_payment.payment_method}")
-
-        ctx.state.booking_confirmed = True
-        return End(data=None)
+        match payment_result.data:
+            case PaymentDetails() as payment:
+                return payment_succeeded(ctx, payment)
+            case BookingFailed() as failure:
+                return payment_failed(ctx, failure)
 
 
 # Create the booking graph with proper initialization
 booking_graph = Graph[BookingState](
     nodes=[SearchFlights, SelectSeat, ProcessPayment],
     name="booking_graph",
+    snapshot_state=snapshot_booking_state,
 )
 
 
@@ -186,11 +278,11 @@ async def main() -> None:
     state = BookingState(origin="SFO", destination="JFK", travel_date=date(2024, 5, 1))
 
     # Run the booking graph
-    async with booking_graph.iter(SearchFlights(), state=state) as run:
-        node = run.next_node
+    async with booking_graph.iter(SearchFlights(), state=state) as graph_run:
+        node = graph_run.next_node
         while not isinstance(node, End):
             print(f"\nExecuting node: {node.__class__.__name__}")
-            node = await run.next(node)
+            node = await graph_run.next(node)
 
         if state.booking_confirmed:
             print("\nBooking process completed successfully!")
@@ -199,4 +291,4 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
@@ -8,14 +8,16 @@ complete travel plans. The models use Pydantic for data validation and serializa
 """
 
 from datetime import date
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class FlightDetails(BaseModel):
     """Details of a flight."""
 
+    model_config = ConfigDict(frozen=True)
+
     flight_number: str = Field(description="Unique flight identifier (e.g., 'AA123', 'DL456')")
     price: float = Field(description="Current price of the flight in USD")
     origin: str = Field(description="Three-letter IATA code for departure airport (e.g., 'SFO')")
@@ -28,6 +30,8 @@ class FlightDetails(BaseModel):
 class SeatPreference(BaseModel):
     """Seat preference details."""
 
+    model_config = ConfigDict(frozen=True)
+
     row: int = Field(ge=1, le=30, description="Row number in the aircraft (1-30)")
     seat: str = Field(
         description="Seat letter (A-F), where A/F are window seats, B/E are middle seats, and C/D are aisle seats"
@@ -37,20 +41,30 @@ class SeatPreference(BaseModel):
         description="Indicates if extra legroom is requested (usually exit rows or bulkhead seats)"
     )
 
+    @field_validator("seat")
+    @classmethod
+    def validate_seat(cls, seat: str) -> str:
+        if seat not in ("A", "B", "C", "D", "E", "F"):
+            raise ValueError("Seat must be a single letter from A to F")
+        return seat
+
 
 class PaymentDetails(BaseModel):
     """Payment processing details."""
 
+    model_config = ConfigDict(frozen=True)
+
     total_amount: float = Field(description="Total payment amount in USD")
     payment_method: str = Field(description="Payment method used (e.g., 'credit_card', 'paypal', 'bank_transfer')")
     confirmation_number: str = Field(description="Unique payment confirmation identifier")
-    status: str = Field(description="Status of the payment: 'success' or 'failed'")
-    failure_reason: Optional[str] = Field(None, description="Reason for payment failure if status is 'failed'")
+    status: Literal["success"] = Field(description="Always 'success'; failed payments are reported as BookingFailed")
 
 
 class TravelPlan(BaseModel):
     """Complete travel plan including flights and recommendations."""
 
+    model_config = ConfigDict(frozen=True)
+
     outbound_flight: FlightDetails = Field(description="Details of the outbound flight")
     return_flight: Optional[FlightDetails] = Field(None, description="Details of the return flight (if round-trip)")
     hotel_recommendations: List[str] = Field(description="List of recommended hotels near the destination")
@@ -63,4 +77,7 @@ class TravelPlan(BaseModel):
 class BookingFailed(BaseModel):
     """Used when booking cannot be completed."""
 
+    model_config = ConfigDict(frozen=True)
+
+    status: Literal["failed"] = Field(description="Always 'failed'")
     reason: str = Field(description="Detailed explanation of why the booking failed")
@@ -12,18 +12,17 @@ import asyncio
 from datetime import date
 from typing import List, Optional, Union
 
-import dotenv
-import logfire
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pydantic_ai import Agent
-from pydantic_ai.messages import ModelMessage
+from pydantic_ai.exceptions import UnexpectedModelBehavior
 from pydantic_ai.usage import Usage, UsageLimits
 
-from config import ACTIVE_MODEL
+from agent_cache import cached_run
+from bootstrap import init, run
+from config import ACTIVE_MODEL, AGENT_SEMAPHORE
 from models import BookingFailed, FlightDetails, PaymentDetails, SeatPreference
 
-dotenv.load_dotenv()
-logfire.configure(send_to_logfire="if-token-present")
+init()
 
 # Flight search agent
 flight_search_agent: Agent[None, List[FlightDetails]] = Agent(
@@ -36,6 +35,7 @@ flight_search_agent: Agent[None, List[FlightDetails]] = Agent(
 seat_selection_agent: Agent[None, SeatPreference] = Agent(
     ACTIVE_MODEL,
     result_type=SeatPreference,
+    retries=3,
     system_prompt="""Help users select their seat based on their preferences.
     - Rows 1, 14, and 20 have extra legroom
     - Seats A and F are window seats
@@ -47,8 +47,12 @@ seat_selection_agent: Agent[None, SeatPreference] = Agent(
 class PaymentResult(BaseModel):
     """Combined payment result type."""
 
-    success: bool
-    data: Union[PaymentDetails, BookingFailed]
+    data: Union[PaymentDetails, BookingFailed] = Field(discriminator="status")
+
+    @property
+    def success(self) -> bool:
+        # Derived from the status tag, so the model can't return a contradicting flag
+        return self.data.status == "success"
 
 
 # Payment processing agent
@@ -60,7 +64,7 @@ payment_agent: Agent[None, PaymentResult] = Agent(
 
 # Mock flight database
 MOCK_FLIGHTS = [
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="AA123",
         price=299.99,
         origin="SFO",
@@ -74,7 +78,9 @@ MOCK_FLIGHTS = [
 
 async def search_flights(usage: Usage, origin: str, destination: str, travel_date: date) -> Optional[FlightDetails]:
     """Step 1: Search for flights."""
-    result = await flight_search_agent.run(f"Find flights from {origin} to {destination} on {travel_date}", usage=usage)
+    result = await cached_run(
+        flight_search_agent, f"Find flights from {origin} to {destination} on {travel_date}", usage=usage
+    )
 
     if not result.data:
         print("No flights found")
@@ -86,33 +92,32 @@ async def search_flights(usage: Usage, origin: str, destination: str, travel_dat
 
 async def select_seat(usage: Usage, preferences: str) -> Optional[SeatPreference]:
     """Step 2: Select seat based on user preferences."""
-    message_history: List[ModelMessage] = []
-
-    while True:
-        result = await seat_selection_agent.run(preferences, usage=usage, message_history=message_history)
-
-        # Validate seat selection
-        seat = result.data
-        if 1 <= seat.row <= 30 and seat.seat in "ABCDEF":
-            return seat
+    # SeatPreference rejects invalid rows and seats, and the agent asks the model to try again (up to 3 times)
+    try:
+        async with AGENT_SEMAPHORE:
+            result = await seat_selection_agent.run(preferences, usage=usage)
+    except UnexpectedModelBehavior:
+        print("Could not find a valid seat")
+        return None
 
-        message_history = result.all_messages(result_tool_return_content="Invalid seat selection, please try again.")
+    return result.data
 
 
 async def process_payment(
     usage: Usage, flight: FlightDetails, seat: SeatPreference, payment_info: str
 ) -> Union[PaymentDetails, BookingFailed]:
     """Step 3: Process payment and confirm booking."""
-    result = await payment_agent.run(
-        f"""Process payment for:
+    async with AGENT_SEMAPHORE:
+        result = await payment_agent.run(
+            f"""Process payment for:
         Flight: {flight.flight_number}
         Price: ${flight.price}
         Seat: {seat.row}{seat.seat}
 
         Payment info: {payment_info}
         """,
-        usage=usage,
-    )
+            usage=usage,
+        )
     payment_result = result.data
     return payment_result.data
 
@@ -122,19 +127,24 @@ async def main() -> None:
     usage = Usage()
     UsageLimits(request_limit=15)
 
-    # Step 1: Search for flights
-    print("\nSearching for flights...")
-    flight = await search_flights(usage=usage, origin="SFO", destination="JFK", travel_date=date(2024, 5, 1))
-
+    # Steps 1 and 2: Search for flights and select a seat. Seat preferences don't depend on
+    # the flight, so both agents run at the same time.
+    print("\nSearching for flights and selecting seat...")
+    async with asyncio.TaskGroup() as tg:
+        flight_task = tg.create_task(
+            search_flights(usage=usage, origin="SFO", destination="JFK", travel_date=date(2024, 5, 1))
+        )
+        seat_task = tg.create_task(
+            select_seat(usage=usage, preferences="I'd like a window seat with extra legroom if possible")
+        )
+
+    flight = flight_task.result()
     if not flight:
         return
 
     print(f"Found flight {flight.flight_number} for ${flight.price}")
 
-    # Step 2: Select seat
-    print("\nSelecting seat...")
-    seat = await select_seat(usage=usage, preferences="I'd like a window seat with extra legroom if possible")
-
+    seat = seat_task.result()
     if not seat:
         return
 
@@ -157,4 +167,4 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
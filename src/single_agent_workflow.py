@@ -1,37 +1,42 @@
 import asyncio
+from collections import defaultdict
 from datetime import date
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
-import dotenv
-import logfire
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from pydantic_ai import Agent, RunContext
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.settings import ModelSettings
 from pydantic_ai.usage import UsageLimits
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 
+from agent_cache import cached_run
+from bootstrap import init, run
 from config import ACTIVE_MODEL
 from models import FlightDetails
 
-dotenv.load_dotenv()
-logfire.configure(send_to_logfire="if-token-present")
+init()
 console = Console()
 
+# Wall-clock limit for a single search, so one slow run can't hold up the whole batch
+SEARCH_TIMEOUT_SECONDS = 15.0
+
 
 class FlightSearchResult(BaseModel):
     """Result of a flight search."""
 
+    model_config = ConfigDict(frozen=True)
+
     found_flights: List[FlightDetails]
     best_flight: Optional[FlightDetails] = None
     explanation: str = Field(description="Explanation of why this flight was chosen as best")
 
 
-# Create the flight search agent
-flight_search_agent: Agent[None, FlightSearchResult] = Agent(
-    ACTIVE_MODEL,
-    result_type=FlightSearchResult,
-    system_prompt="""You are a flight search expert. For every query, you must:
+# Static system prompt: nothing is interpolated per run, so providers with prompt
+# caching can reuse it as a cached prefix
+SYSTEM_PROMPT = """You are a flight search expert. For every query, you must:
 1. FIRST use the search_flights tool to find available flights
 2. Then analyze the results to find the best option based on the user's preferences
 3. Finally, provide a clear explanation of why you chose that flight
@@ -40,6 +45,9 @@ When using search_flights:
 - Extract the date from the user's query (e.g., "May 1st, 2024")
 - Use airport codes (e.g., SFO, JFK)
 
+If the user asks for the cheapest or fastest flight, use the cheapest_flight or
+fastest_flight tool to pick it rather than comparing the flights yourself.
+
 When choosing the best flight, consider:
 - Price vs duration tradeoff
 - Time of day preferences (if specified)
@@ -47,12 +55,21 @@ When choosing the best flight, consider:
 - Any other relevant factors
 
 Remember: You MUST use search_flights first before making any recommendations.
-""",
+"""
+
+# Create the flight search agent. Parallel tool calls let the model search several
+# legs in one turn; pydantic-ai then runs those calls concurrently. max_tokens caps each
+# response at the provider, so a runaway generation stops early instead of running on.
+flight_search_agent: Agent[None, FlightSearchResult] = Agent(
+    ACTIVE_MODEL,
+    result_type=FlightSearchResult,
+    system_prompt=SYSTEM_PROMPT,
+    model_settings=ModelSettings(parallel_tool_calls=True, max_tokens=1024),
 )
 
 # Mock flight database with more variety
 MOCK_FLIGHTS = [
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="AA123",
         price=299.99,
         origin="SFO",
@@ -61,7 +78,7 @@ MOCK_FLIGHTS = [
         arrival_date=date(2024, 5, 1),
         duration_hours=5.5,
     ),
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="UA456",
         price=349.99,
         origin="SFO",
@@ -70,7 +87,7 @@ MOCK_FLIGHTS = [
         arrival_date=date(2024, 5, 1),
         duration_hours=5.0,
     ),
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="DL789",
         price=275.50,
         origin="SFO",
@@ -79,7 +96,7 @@ MOCK_FLIGHTS = [
         arrival_date=date(2024, 5, 1),
         duration_hours=6.5,
     ),
-    FlightDetails(
+    FlightDetails.model_construct(
         flight_number="B6012",
         price=225.00,
         origin="SFO",
@@ -91,6 +108,23 @@ MOCK_FLIGHTS = [
 ]
 
 
+def _build_index(flights: List[FlightDetails]) -> Dict[Tuple[str, str, date], List[FlightDetails]]:
+    index: Dict[Tuple[str, str, date], List[FlightDetails]] = defaultdict(list)
+    for flight in flights:
+        index[(flight.origin, flight.destination, flight.departure_date)].append(flight)
+    return index
+
+
+# Flights indexed by route and departure date, so lookups don't scan the whole database
+FLIGHT_INDEX = _build_index(MOCK_FLIGHTS)
+
+
+def find_route(origin: str, destination: str, travel_date: date) -> List[FlightDetails]:
+    """Look up the flights for a route, normalizing the codes so "sfo" and " SFO" find the same flights."""
+    # In reality, this would call an actual flight search API
+    return FLIGHT_INDEX.get((origin.strip().upper(), destination.strip().upper(), travel_date), [])
+
+
 @flight_search_agent.tool
 async def search_flights(
     ctx: RunContext[None], origin: str, destination: str, travel_date: date
@@ -102,30 +136,78 @@ async def search_flights(
         destination: Destination airport code
         travel_date: Desired travel date
     """
-    # In reality, this would call an actual flight search API
-    return [
-        f
-        for f in MOCK_FLIGHTS
-        if f.origin == origin and f.destination == destination and f.departure_date == travel_date
-    ]
+    return list(find_route(origin, destination, travel_date))
+
+
+@flight_search_agent.tool
+async def cheapest_flight(
+    ctx: RunContext[None], origin: str, destination: str, travel_date: date
+) -> Optional[FlightDetails]:
+    """Find the cheapest flight on a route, or None if there are no flights.
+
+    Args:
+        origin: Origin airport code
+        destination: Destination airport code
+        travel_date: Desired travel date
+    """
+    return min(find_route(origin, destination, travel_date), key=lambda flight: flight.price, default=None)
+
+
+@flight_search_agent.tool
+async def fastest_flight(
+    ctx: RunContext[None], origin: str, destination: str, travel_date: date
+) -> Optional[FlightDetails]:
+    """Find the shortest flight on a route, or None if there are no flights.
+
+    Args:
+        origin: Origin airport code
+        destination: Destination airport code
+        travel_date: Desired travel date
+    """
+    return min(find_route(origin, destination, travel_date), key=lambda flight: flight.duration_hours, default=None)
 
 
 def display_flights(flights: List[FlightDetails]) -> None:
     """Display flights in a pretty table format."""
+    rows = [(flight.flight_number, f"${flight.price:.2f}", f"{flight.duration_hours:.1f}h") for flight in flights]
+
+    # Skip table rendering when the output isn't a terminal (e.g. piped to a file)
+    if not console.is_terminal:
+        console.out("\n".join("\t".join(row) for row in rows))
+        return
+
     table = Table(title="Available Flights")
     table.add_column("Flight", style="cyan")
     table.add_column("Price", style="green")
     table.add_column("Duration", style="magenta")
 
-    for flight in flights:
-        table.add_row(flight.flight_number, f"${flight.price:.2f}", f"{flight.duration_hours:.1f}h")
+    for row in rows:
+        table.add_row(*row)
 
     console.print(table)
 
 
+async def run_batch_async(
+    prompts: Sequence[str],
+    usage_limits: Optional[UsageLimits] = None,
+    timeout: float = SEARCH_TIMEOUT_SECONDS,
+) -> List[Union[AgentRunResult[FlightSearchResult], BaseException]]:
+    """Run the flight search agent over many prompts concurrently.
+
+    At most MAX_AGENT_CONCURRENCY searches talk to the model at once, and each gets `timeout`
+    seconds once it starts. Results are returned in the same order as `prompts`; a failed or
+    timed out search returns its exception.
+    """
+    return await asyncio.gather(
+        *(cached_run(flight_search_agent, prompt, usage_limits=usage_limits, timeout=timeout) for prompt in prompts),
+        return_exceptions=True,
+    )
+
+
 async def main() -> None:
-    # Set usage limits
-    usage_limits = UsageLimits(request_limit=5)
+    # Set usage limits. These are checked after each response, so they stop further requests
+    # once a search has used too much rather than cutting a response short.
+    usage_limits = UsageLimits(request_limit=5, response_tokens_limit=1024)
 
     # Example searches with different preferences
     searches = [
@@ -134,10 +216,16 @@ async def main() -> None:
         "What's the fastest flight from SFO to JFK on May 1st, 2024?",
     ]
 
-    for search in searches:
+    # The searches are independent, so run them all at once and print the results in order
+    results = await run_batch_async(searches, usage_limits=usage_limits)
+
+    for search, result in zip(searches, results, strict=True):
         console.print(Panel(f"[bold blue]Search Query:[/] {search}"))
 
-        result = await flight_search_agent.run(search, usage_limits=usage_limits)
+        if isinstance(result, BaseException):
+            console.print(f"\n[bold red]Search failed:[/] {str(result) or type(result).__name__}")
+            console.print("\n" + "=" * 80 + "\n")
+            continue
 
         console.print("\n[bold]Available Flights:[/]")
         display_flights(result.data.found_flights)
@@ -153,4 +241,4 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
@@ -0,0 +1,109 @@
+"""Tests for the agent response cache."""
+
+import asyncio
+from typing import List, Optional
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.models.test import TestModel
+
+import agent_cache
+from agent_cache import cached_run, clear_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache() -> None:
+    clear_cache()
+
+
+def make_agent() -> Agent[None, str]:
+    return Agent(TestModel(), result_type=str)
+
+
+def test_hit_returns_cached_result() -> None:
+    agent = make_agent()
+
+    first = asyncio.run(cached_run(agent, "SFO to JFK"))
+    second = asyncio.run(cached_run(agent, "SFO to JFK"))
+    other = asyncio.run(cached_run(agent, "JFK to SFO"))
+
+    assert second is first
+    assert other is not first
+
+
+def test_results_are_not_shared_between_agents() -> None:
+    first = asyncio.run(cached_run(make_agent(), "SFO to JFK"))
+    second = asyncio.run(cached_run(make_agent(), "SFO to JFK"))
+
+    assert second is not first
+
+
+def test_expired_result_is_refreshed(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent = make_agent()
+    now = 1000.0
+    monkeypatch.setattr(agent_cache.time, "monotonic", lambda: now)
+
+    first = asyncio.run(cached_run(agent, "SFO to JFK", ttl=60))
+    now += 59
+    assert asyncio.run(cached_run(agent, "SFO to JFK", ttl=60)) is first
+
+    now += 2
+    assert asyncio.run(cached_run(agent, "SFO to JFK", ttl=60)) is not first
+
+
+def test_least_recently_used_is_evicted(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent = make_agent()
+    monkeypatch.setattr(agent_cache, "CACHE_SIZE", 2)
+
+    first = asyncio.run(cached_run(agent, "first"))
+    second = asyncio.run(cached_run(agent, "second"))
+    asyncio.run(cached_run(agent, "first"))  # "second" is now the least recently used
+    asyncio.run(cached_run(agent, "third"))
+
+    assert asyncio.run(cached_run(agent, "first")) is first
+    assert asyncio.run(cached_run(agent, "second")) is not second
+
+
+def make_slow_agent(delay: float) -> Agent[None, str]:
+    async def slow_model(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(delay)
+        return ModelResponse(parts=[TextPart("done")])
+
+    return Agent(FunctionModel(slow_model), result_type=str)
+
+
+def test_slow_run_times_out() -> None:
+    with pytest.raises(TimeoutError):
+        asyncio.run(cached_run(make_slow_agent(0.2), "SFO to JFK", timeout=0.05))
+
+
+@pytest.mark.parametrize("timeout", [None, 5.0])
+def test_timeout_error_from_the_run_is_not_replaced(timeout: Optional[float]) -> None:
+    def failing_model(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        raise TimeoutError("flight API timed out")
+
+    agent: Agent[None, str] = Agent(FunctionModel(failing_model), result_type=str)
+
+    with pytest.raises(TimeoutError, match="flight API timed out"):
+        asyncio.run(cached_run(agent, "SFO to JFK", timeout=timeout))
+
+
+def test_timeout_excludes_waiting_for_a_slot(monkeypatch: pytest.MonkeyPatch) -> None:
+    semaphore = asyncio.Semaphore(1)
+    monkeypatch.setattr(agent_cache, "AGENT_SEMAPHORE", semaphore)
+
+    async def run_after_waiting() -> AgentRunResult[str]:
+        await semaphore.acquire()
+        run = asyncio.create_task(cached_run(make_agent(), "SFO to JFK", timeout=0.1))
+
+        # Keep the slot well past the timeout; only the (instant) model run should be timed
+        await asyncio.sleep(0.3)
+        assert not run.done()
+        semaphore.release()
+
+        return await run
+
+    assert asyncio.run(run_after_waiting()).data
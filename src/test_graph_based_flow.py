@@ -0,0 +1,61 @@
+"""Tests for message history trimming in the graph-based flow."""
+
+from typing import List
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelRequestPart,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from graph_based_flow import trim_history
+
+
+def agent_run(prompt: str, tool_rounds: int, first: bool = False) -> List[ModelMessage]:
+    """Messages for one agent run: the prompt, `tool_rounds` tool call/return pairs and a final answer."""
+    parts: List[ModelRequestPart] = [UserPromptPart(prompt)]
+    if first:
+        parts.insert(0, SystemPromptPart("system"))
+    messages: List[ModelMessage] = [ModelRequest(parts=parts)]
+    for i in range(tool_rounds):
+        messages.append(ModelResponse(parts=[ToolCallPart("search_flights", {}, tool_call_id=f"{prompt}-{i}")]))
+        messages.append(ModelRequest(parts=[ToolReturnPart("search_flights", [], tool_call_id=f"{prompt}-{i}")]))
+    messages.append(ModelResponse(parts=[TextPart(f"{prompt} done")]))
+    return messages
+
+
+def test_short_history_is_unchanged() -> None:
+    messages = agent_run("first", 2, first=True)
+
+    assert trim_history(messages, keep=20) == messages
+
+
+def test_window_starts_on_a_user_prompt() -> None:
+    runs = [agent_run("first", 3, first=True), agent_run("second", 3), agent_run("third", 1)]
+    messages = [message for run in runs for message in run]
+
+    trimmed = trim_history(messages, keep=6)
+
+    # The window would start inside "second", so it moves forward to the start of "third"
+    assert trimmed == [messages[0], *runs[2]]
+
+
+def test_long_latest_run_is_kept_whole() -> None:
+    first = agent_run("first", 1, first=True)
+    latest = agent_run("latest", 12)
+
+    trimmed = trim_history([*first, *latest], keep=20)
+
+    assert trimmed == [first[0], *latest]
+
+
+def test_single_long_run_is_unchanged() -> None:
+    messages = agent_run("only", 12, first=True)
+
+    assert trim_history(messages, keep=20) == messages